@@ -4,15 +4,21 @@ import certifi
 # Ensure the Python SSL layer uses the certifi CA bundle (fixes macOS "unable to get local issuer" errors)
 os.environ.setdefault("SSL_CERT_FILE", certifi.where())
 
+import asyncio
+import aiohttp
 import discord
 from discord.ext import commands
 import io
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
+import time
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from itertools import islice
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from datetime import datetime, timedelta, timezone
 
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import GetAssetsRequest
@@ -20,6 +26,12 @@ from alpaca.trading.enums import AssetClass, AssetStatus
 
 from dotenv import load_dotenv
 
+try:
+    # orjson decodes the large bars payloads several times faster than json
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 # Load tokens
 load_dotenv()
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
@@ -27,14 +39,20 @@ ALPACA_API_KEY = os.getenv("ALPACA_API_KEY")
 ALPACA_SECRET_KEY = os.getenv("ALPACA_SECRET_KEY")
 GUILD_ID = os.getenv("GUILD_ID")
 
+# Market data comes straight from Alpaca's REST API over a shared aiohttp
+# session (created in StockBot.setup_hook); account/trading calls still use the SDK.
+ALPACA_DATA_URL = "https://data.alpaca.markets/v2"
+ALPACA_HEADERS = {
+    "APCA-API-KEY-ID": ALPACA_API_KEY or "",
+    "APCA-API-SECRET-KEY": ALPACA_SECRET_KEY or "",
+}
+
 # Initialize Alpaca clients
 try:
-    alpaca_data_client = StockHistoricalDataClient(ALPACA_API_KEY, ALPACA_SECRET_KEY)
     alpaca_trading_client = TradingClient(ALPACA_API_KEY, ALPACA_SECRET_KEY, paper=True)
     print("✅ Alpaca clients initialized successfully")
 except Exception as e:
     print(f"❌ Failed to initialize Alpaca clients: {e}")
-    alpaca_data_client = None
     alpaca_trading_client = None
 
 # Discord setup
@@ -43,18 +61,481 @@ intents.guilds = True
 intents.guild_messages = True
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="/", intents=intents)
+class StockBot(commands.Bot):
+    """Bot that owns the shared Alpaca HTTP session and the popular-quotes poller"""
+    
+    alpaca_session = None
+    popular_task = None
+    
+    async def setup_hook(self):
+        # Runs once before connecting, so both exist before any command arrives.
+        # One keep-alive session with the auth headers bound, so every request
+        # reuses pooled TCP+TLS connections
+        self.alpaca_session = aiohttp.ClientSession(
+            headers=ALPACA_HEADERS,
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300)
+        )
+        self.popular_task = asyncio.create_task(poll_popular())
+    
+    async def close(self):
+        if self.popular_task is not None:
+            self.popular_task.cancel()
+        if self.alpaca_session is not None:
+            await self.alpaca_session.close()
+        await super().close()
+
+
+bot = StockBot(command_prefix="/", intents=intents)
 
 @bot.event
 async def on_ready():
     print(f"{bot.user} is now available ✅")
+    
     try:
         synced = await bot.tree.sync()
         print(f"Synced {len(synced)} command(s)")
     except Exception as e:
         print(f"Failed to sync commands: {e}")
 
+# ==================== MARKET DATA ====================
+
+Bar = namedtuple("Bar", ["timestamp", "open", "high", "low", "close", "volume"])
+
+
+def _parse_bar(raw):
+    """Convert one bar from the Alpaca JSON payload into a Bar"""
+    return Bar(
+        timestamp=datetime.fromisoformat(raw["t"].replace("Z", "+00:00")),
+        open=raw["o"],
+        high=raw["h"],
+        low=raw["l"],
+        close=raw["c"],
+        volume=raw["v"],
+    )
+
+
+# Like the SDK, rate-limited (429) and gateway-timeout (504) responses
+# are retried a few times before giving up.
+ALPACA_RETRY_STATUSES = {429, 504}
+ALPACA_RETRY_ATTEMPTS = 3
+ALPACA_RETRY_WAIT = 3
+
+
+class AlpacaDataError(Exception):
+    """Alpaca market data request failed; str() is Alpaca's own error message"""
+
+
+def _error_message(body, resp):
+    """Pull Alpaca's 'message' out of an error body, falling back to the HTTP reason"""
+    try:
+        message = json_loads(body).get("message")
+    except Exception:
+        message = None
+    return message or f"{resp.status} {resp.reason}"
+
+
+async def _alpaca_get(path, params):
+    """GET a market data endpoint and return the raw response body"""
+    for attempt in range(ALPACA_RETRY_ATTEMPTS + 1):
+        async with bot.alpaca_session.get(f"{ALPACA_DATA_URL}{path}", params=params) as resp:
+            body = await resp.read()
+            if resp.status < 400:
+                return body
+            if resp.status not in ALPACA_RETRY_STATUSES or attempt == ALPACA_RETRY_ATTEMPTS:
+                raise AlpacaDataError(_error_message(body, resp))
+            retry_after = resp.headers.get("Retry-After", "")
+        
+        await asyncio.sleep(int(retry_after) if retry_after.isdigit() else ALPACA_RETRY_WAIT)
+
+
+def _decode_bars_page(body):
+    """Decode one /stocks/bars page into ({symbol: [Bar, ...]}, next_page_token)"""
+    payload = json_loads(body)
+    bars = {
+        symbol: [_parse_bar(raw) for raw in raw_bars]
+        for symbol, raw_bars in (payload.get("bars") or {}).items()
+    }
+    return bars, payload.get("next_page_token")
+
+
+def _decode_latest_bars(body):
+    """Decode a /stocks/bars/latest response into {symbol: Bar}"""
+    payload = json_loads(body)
+    return {symbol: _parse_bar(raw) for symbol, raw in (payload.get("bars") or {}).items()}
+
+
+# Fixed query parameters for daily bars; each request only adds symbols,
+# start and (when paginating) page_token to a copy of this.
+DAILY_BARS_PARAMS = {"timeframe": "1Day", "limit": 10000}
+
+
+async def get_bars(template, symbols, start):
+    """Fetch {symbol: [Bar, ...]} from /v2/stocks/bars, following pagination"""
+    params = dict(
+        template,
+        symbols=",".join(symbols),
+        start=start.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    )
+    bars = {}
+    
+    while True:
+        body = await _alpaca_get("/stocks/bars", params)
+        
+        # Decoding and parsing large pages is CPU work; keep it off the event loop
+        page, page_token = await asyncio.to_thread(_decode_bars_page, body)
+        for symbol, symbol_bars in page.items():
+            bars.setdefault(symbol, []).extend(symbol_bars)
+        
+        if not page_token:
+            return bars
+        params["page_token"] = page_token
+
+
+async def get_latest_bar_map(symbols):
+    """Fetch {symbol: latest 1-minute Bar} from /v2/stocks/bars/latest"""
+    params = {"symbols": ",".join(symbols)}
+    body = await _alpaca_get("/stocks/bars/latest", params)
+    return _decode_latest_bars(body)
+
+# ==================== STATIC DATA ====================
+
+# Popular stock lists by category
+STOCK_CATEGORIES = {
+    "tech": {
+        "name": "Technology Giants",
+        "stocks": ["AAPL", "MSFT", "GOOGL", "META", "NVDA", "TSLA", "AMD", "INTC", "CRM", "ORCL"]
+    },
+    "finance": {
+        "name": "Financial Services",
+        "stocks": ["JPM", "BAC", "WFC", "GS", "MS", "C", "BLK", "AXP", "SCHW", "USB"]
+    },
+    "healthcare": {
+        "name": "Healthcare & Pharma",
+        "stocks": ["JNJ", "UNH", "PFE", "ABBV", "TMO", "MRK", "ABT", "LLY", "DHR", "CVS"]
+    },
+    "consumer": {
+        "name": "Consumer Goods",
+        "stocks": ["AMZN", "WMT", "HD", "NKE", "MCD", "SBUX", "TGT", "LOW", "COST", "PG"]
+    },
+    "energy": {
+        "name": "Energy & Oil",
+        "stocks": ["XOM", "CVX", "COP", "SLB", "EOG", "PXD", "MPC", "PSX", "VLO", "OXY"]
+    },
+    "entertainment": {
+        "name": "Media & Entertainment",
+        "stocks": ["DIS", "NFLX", "CMCSA", "WBD", "PARA", "EA", "TTWO", "LYV", "SPOT", "RBLX"]
+    },
+    "automotive": {
+        "name": "Automotive",
+        "stocks": ["TSLA", "F", "GM", "RIVN", "LCID", "NIO", "XPEV", "LI", "TM", "HMC"]
+    },
+    "airlines": {
+        "name": "Airlines & Travel",
+        "stocks": ["DAL", "AAL", "UAL", "LUV", "ALK", "JBLU", "SAVE", "HA", "SKYW", "ALGT"]
+    }
+}
+
+# /browse fields: (name, value)
+BROWSE_CATEGORIES = [
+    ("💻 Tech", "`/popular tech`\nApple, Microsoft, Google, Meta, Nvidia, Tesla, AMD, Intel"),
+    ("💰 Finance", "`/popular finance`\nJPMorgan, Bank of America, Wells Fargo, Goldman Sachs"),
+    ("🏥 Healthcare", "`/popular healthcare`\nJohnson & Johnson, UnitedHealth, Pfizer, AbbVie"),
+    ("🛒 Consumer", "`/popular consumer`\nAmazon, Walmart, Home Depot, Nike, McDonald's"),
+    ("⚡ Energy", "`/popular energy`\nExxon, Chevron, ConocoPhillips, Schlumberger"),
+    ("🎬 Entertainment", "`/popular entertainment`\nDisney, Netflix, Comcast, EA, Spotify"),
+    ("🚗 Automotive", "`/popular automotive`\nTesla, Ford, GM, Rivian, Lucid, NIO"),
+    ("✈️ Airlines", "`/popular airlines`\nDelta, American, United, Southwest"),
+]
+
+# /help fields: (name, value)
+COMMANDS_INFO = [
+    ("🔍 /search <query>", "Search for stocks by symbol or name\nExample: `/search Apple` or `/search TSLA`"),
+    ("📂 /browse", "Browse all available stock categories"),
+    ("⭐ /popular [category]", "View popular stocks by category\nExample: `/popular tech` or `/popular finance`"),
+    ("📈 /price <symbol>", "Get the latest price of a stock\nExample: `/price AAPL`"),
+    ("📊 /chart <symbol> [days]", "Display a stock price chart\nExample: `/chart TSLA 60`"),
+    ("📊 /compare <symbols> [days]", "Compare multiple stocks\nExample: `/compare AAPL,TSLA,MSFT 30`"),
+    ("💼 /account", "View your Alpaca account information"),
+    ("📊 /positions", "View your current stock positions"),
+    ("🏦 /market", "Check if the stock market is open"),
+    ("📚 /help", "Show this help message"),
+]
+
+# /browse and /help never change, so their embeds are built once and copied
+# per request (only the timestamp is set on the copy)
+def _static_embed(title, description, color, fields, footer):
+    """Build an embed from (name, value) field pairs, all full-width"""
+    embed = discord.Embed(title=title, description=description, color=color)
+    for name, value in fields:
+        embed.add_field(name=name, value=value, inline=False)
+    embed.set_footer(text=footer)
+    return embed
+
+
+_BROWSE_EMBED = _static_embed(
+    "📂 Browse Stock Categories",
+    "Choose a category to explore popular stocks",
+    discord.Color.purple(),
+    BROWSE_CATEGORIES,
+    "Or use /search <query> to find specific stocks"
+)
+
+_HELP_EMBED = _static_embed(
+    "📚 Stock Market Bot Commands",
+    "Track stocks and manage your portfolio with Alpaca API",
+    discord.Color.blue(),
+    COMMANDS_INFO,
+    "Powered by Alpaca API"
+)
+
+# /compare line colors, cycled per symbol
+CHART_COLORS = ['#00A3E0', '#FF6B6B', '#4ECDC4', '#FFD93D', '#A8E6CF']
+
+# ==================== CACHES ====================
+
+# Active US equities change rarely, so the full asset list is fetched at most
+# once per ASSETS_CACHE_TTL seconds and shared by every /search call.
+ASSETS_CACHE_TTL = 3600
+_assets_cache = {"ts": 0, "data": None, "symbols_up": [], "names_up": [], "sorted_symbols": [], "sorted_index": []}
+_assets_lock = asyncio.Lock()
+
+
+async def get_assets_cached():
+    """Return the asset cache (assets plus parallel uppercased symbols/names), refreshing it when stale"""
+    async with _assets_lock:
+        if _assets_cache["data"] is None or time.time() - _assets_cache["ts"] > ASSETS_CACHE_TTL:
+            search_params = GetAssetsRequest(
+                asset_class=AssetClass.US_EQUITY,
+                status=AssetStatus.ACTIVE
+            )
+            assets = await asyncio.to_thread(alpaca_trading_client.get_all_assets, search_params)
+            # Uppercase once here so searches don't re-allocate 2N strings per query
+            _assets_cache["data"] = assets
+            _assets_cache["symbols_up"] = [a.symbol.upper() for a in assets]
+            _assets_cache["names_up"] = [(a.name or "").upper() for a in assets]
+            # Sorted symbols allow bisecting straight to the block of prefix matches
+            by_symbol = sorted((sym, i) for i, sym in enumerate(_assets_cache["symbols_up"]))
+            _assets_cache["sorted_symbols"] = [sym for sym, _ in by_symbol]
+            _assets_cache["sorted_index"] = [i for _, i in by_symbol]
+            _assets_cache["ts"] = time.time()
+        return _assets_cache
+
+
+def find_assets(cache, query, limit=15):
+    """Return up to limit assets whose symbol starts with query, then any whose symbol or name contains it"""
+    assets = cache["data"]
+    sorted_symbols = cache["sorted_symbols"]
+    sorted_index = cache["sorted_index"]
+    
+    # Symbol prefix matches (the common case, e.g. "TSL" -> TSLA) in O(log N + k)
+    picked = []
+    pos = bisect_left(sorted_symbols, query)
+    while pos < len(sorted_symbols) and len(picked) < limit and sorted_symbols[pos].startswith(query):
+        picked.append(sorted_index[pos])
+        pos += 1
+    
+    # Fall back to a substring scan over symbols and names for the remainder
+    if len(picked) < limit:
+        seen = set(picked)
+        picked.extend(islice(
+            (
+                i for i, (sym, name) in enumerate(zip(cache["symbols_up"], cache["names_up"]))
+                if i not in seen and (query in sym or query in name)
+            ),
+            limit - len(picked)
+        ))
+    
+    return [assets[i] for i in picked]
+
+# The latest 1-minute bar is the same for everyone asking within a minute, so
+# quotes are cached per (symbols, clock minute) with LRU eviction.
+QUOTE_CACHE_SIZE = 512
+_quote_cache = OrderedDict()
+
+
+async def get_latest_bars(symbols):
+    """Return {symbol: latest 1-minute bar} for the given symbols, cached per minute"""
+    key = (tuple(symbols), int(time.time() // 60))
+    latest = _quote_cache.get(key)
+    if latest is not None:
+        _quote_cache.move_to_end(key)
+        return latest
+    
+    # One bar per symbol, rather than a day of minute bars to keep only the last
+    latest = await get_latest_bar_map(symbols)
+    
+    _quote_cache[key] = latest
+    if len(_quote_cache) > QUOTE_CACHE_SIZE:
+        _quote_cache.popitem(last=False)
+    return latest
+
+# Every popular symbol (deduplicated across categories) is polled in one
+# batched request by a background task, so /popular reads quotes from memory.
+# A snapshot older than POPULAR_MAX_AGE (e.g. polls keep failing) is ignored.
+ALL_POPULAR = sorted({s for c in STOCK_CATEGORIES.values() for s in c["stocks"]})
+POPULAR_POLL_INTERVAL = 60
+POPULAR_MAX_AGE = 2 * POPULAR_POLL_INTERVAL
+_popular_snapshot = {"ts": 0, "quotes": {}}
+
+
+async def poll_popular():
+    """Replace the _popular_snapshot quotes for ALL_POPULAR every POPULAR_POLL_INTERVAL seconds"""
+    while True:
+        try:
+            _popular_snapshot["quotes"] = await get_latest_bars(ALL_POPULAR)
+            _popular_snapshot["ts"] = time.time()
+        except Exception as e:
+            print(f"Failed to refresh popular quotes: {e}")
+        await asyncio.sleep(POPULAR_POLL_INTERVAL)
+
+# ==================== CHARTS ====================
+
+# A single Agg-backed figure is reused for every chart instead of building and
+# tearing down a pyplot figure per command. Matplotlib isn't thread-safe, so
+# renders are serialized with _chart_lock and run via asyncio.to_thread.
+_fig = Figure(figsize=(12, 6))
+FigureCanvasAgg(_fig)
+_ax = _fig.add_subplot()
+_chart_lock = asyncio.Lock()
+CHART_DPI = 80
+
+
+_BAR_DTYPE = np.dtype([('t', 'f8'), ('c', 'f8')])
+
+
+def _bars_to_arrays(data):
+    """Convert a list of bars into (datetime64 dates, float closes) arrays in one pass"""
+    arr = np.fromiter(
+        ((bar.timestamp.timestamp(), bar.close) for bar in data),
+        dtype=_BAR_DTYPE,
+        count=len(data)
+    )
+    dates = arr['t'].astype('int64').astype('datetime64[s]')
+    return dates, arr['c']
+
+
+try:
+    # Ahead-of-time build from build_native.py: no JIT compile on the first chart
+    from bot_native import lttb_core, normalize_pct
+except ImportError:
+    import chart_kernels
+    
+    try:
+        from numba import njit
+    except ImportError:  # numba is optional; the kernels still work as plain NumPy
+        def njit(*args, **kwargs):
+            return lambda func: func
+    
+    lttb_core = njit(cache=True, fastmath=True)(chart_kernels.lttb_core)
+    normalize_pct = njit(cache=True, fastmath=True)(chart_kernels.normalize_pct)
+
+# Series longer than LTTB_THRESHOLD points are downsampled to LTTB_POINTS
+# before plotting; render time and PNG size scale with point count.
+LTTB_THRESHOLD = 150
+LTTB_POINTS = 120
+
+
+def lttb(x, y, n_out=LTTB_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the points to keep"""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    return lttb_core(
+        np.ascontiguousarray(x, dtype=np.float64),
+        np.ascontiguousarray(y, dtype=np.float64),
+        n_out
+    )
+
+
+def _downsample(dates, values):
+    """Apply LTTB to a (dates, values) series when it's long enough to matter"""
+    if len(values) <= LTTB_THRESHOLD:
+        return dates, values
+    keep = lttb(dates.astype(np.int64), values)
+    return dates[keep], values[keep]
+
+
+def _save_chart():
+    """Lay out the shared figure and return it as PNG bytes"""
+    _ax.grid(True, alpha=0.3)
+    _ax.tick_params(axis='x', labelrotation=45)
+    _fig.tight_layout()
+    
+    # Let Pillow optimize the PNG encoding; smaller files upload to Discord faster
+    buffer = io.BytesIO()
+    _fig.savefig(buffer, format='png', dpi=CHART_DPI, pil_kwargs={'optimize': True})
+    return buffer.getvalue()
+
+
+def _render_price_chart(symbol, days, dates, closes):
+    """Draw a single-stock price chart and return PNG bytes"""
+    dates, closes = _downsample(dates, closes)
+    
+    _ax.clear()
+    _ax.plot(dates, closes, linewidth=2, color='#00A3E0')
+    _ax.fill_between(dates, closes, alpha=0.3, color='#00A3E0')
+    
+    min_price = closes.min()
+    max_price = closes.max()
+    price_range = max_price - min_price
+    padding = price_range * 0.05  # 5% padding
+    
+    _ax.set_ylim(min_price - padding, max_price + padding)
+    
+    _ax.set_title(f'{symbol} Stock Price - Last {days} Days', fontsize=16, fontweight='bold')
+    _ax.set_xlabel('Date', fontsize=12)
+    _ax.set_ylabel('Price ($)', fontsize=12)
+    return _save_chart()
+
+
+def _render_comparison_chart(days, series):
+    """Draw % change lines for (symbol, dates, closes, color) series and return PNG bytes"""
+    _ax.clear()
+    for symbol, dates, closes, color in series:
+        # Normalize to percentage change here, on the worker thread, since the
+        # first JIT-compiled call can take hundreds of ms
+        dates, normalized = _downsample(dates, normalize_pct(closes))
+        _ax.plot(dates, normalized, linewidth=2, label=symbol, color=color)
+    
+    _ax.set_title(f'Stock Comparison - Last {days} Days (% Change)', fontsize=16, fontweight='bold')
+    _ax.set_xlabel('Date', fontsize=12)
+    _ax.set_ylabel('% Change', fontsize=12)
+    if series:
+        _ax.legend(loc='best')
+    _ax.axhline(y=0, color='black', linestyle='--', alpha=0.5)
+    return _save_chart()
+
+
+# Rendered PNGs are cached per (kind, days, symbols) plus the first and last
+# bar timestamps of each series. Bars are always fetched fresh, so a new
+# trading day or a shifted window re-renders; repeats within it skip matplotlib.
+CHART_CACHE_SIZE = 64
+_chart_cache = OrderedDict()
+
+
+def get_cached_chart(key):
+    """Return the cached entry for key, or None"""
+    cached = _chart_cache.get(key)
+    if cached is not None:
+        _chart_cache.move_to_end(key)
+    return cached
+
+
+def cache_chart(key, value):
+    """Store a rendered chart entry, evicting the least recently used one when full"""
+    _chart_cache[key] = value
+    if len(_chart_cache) > CHART_CACHE_SIZE:
+        _chart_cache.popitem(last=False)
+
+
+async def render_chart(render, *args):
+    """Run a chart renderer on a worker thread, one render at a time"""
+    async with _chart_lock:
+        return await asyncio.to_thread(render, *args)
+
 # ==================== STOCK COMMANDS ====================
+# The Alpaca trading SDK is blocking, so its calls go through asyncio.to_thread
+# to keep the event loop free while the HTTP request is in flight.
 
 @bot.tree.command(name="price", description="Get the latest price of a stock")
 async def get_price(interaction: discord.Interaction, symbol: str):
@@ -65,17 +546,9 @@ async def get_price(interaction: discord.Interaction, symbol: str):
         symbol = symbol.upper()
         
         # Get the latest bar (1-minute data)
-        request_params = StockBarsRequest(
-            symbol_or_symbols=symbol,
-            timeframe=TimeFrame.Minute,
-            start=datetime.now() - timedelta(days=1)
-        )
-        
-        bars = alpaca_data_client.get_stock_bars(request_params)
+        latest_bar = (await get_latest_bars((symbol,))).get(symbol)
         
-        if symbol in bars.data and len(bars.data[symbol]) > 0:
-            latest_bar = bars.data[symbol][-1]
-            
+        if latest_bar is not None:
             embed = discord.Embed(
                 title=f"📈 {symbol} Stock Price",
                 color=discord.Color.green() if latest_bar.close >= latest_bar.open else discord.Color.red(),
@@ -119,69 +592,48 @@ async def get_chart(interaction: discord.Interaction, symbol: str, days: int = 3
         elif days < 1:
             days = 1
         
-        # Get historical data
-        request_params = StockBarsRequest(
-            symbol_or_symbols=symbol,
-            timeframe=TimeFrame.Day,
-            start=datetime.now() - timedelta(days=days)
-        )
+        # Get historical data; always fresh so the stats below reflect today's bar
+        bars = await get_bars(DAILY_BARS_PARAMS, (symbol,), datetime.now(timezone.utc) - timedelta(days=days))
         
-        bars = alpaca_data_client.get_stock_bars(request_params)
+        if not bars.get(symbol):
+            await interaction.followup.send(f"❌ Could not find data for symbol: {symbol}")
+            return
         
-        if symbol in bars.data and len(bars.data[symbol]) > 0:
-            data = bars.data[symbol]
-            dates = [bar.timestamp for bar in data]
-            closes = [bar.close for bar in data]
-            
+        dates, closes = _bars_to_arrays(bars[symbol])
+        
+        # Only the PNG is cached, keyed on the window's first and last bars so the
+        # image always matches the stats below
+        key = ("chart", symbol, days, bars[symbol][0].timestamp, bars[symbol][-1].timestamp)
+        png = get_cached_chart(key)
+        
+        if png is None:
             # Create the chart
-            plt.figure(figsize=(12, 6))
-            plt.plot(dates, closes, linewidth=2, color='#00A3E0')
-            plt.fill_between(dates, closes, alpha=0.3, color='#00A3E0')
-            
-            min_price = min(closes)
-            max_price = max(closes)
-            price_range = max_price - min_price
-            padding = price_range * 0.05  # 5% padding
-            
-            plt.ylim(min_price - padding, max_price + padding)
-            
-            plt.title(f'{symbol} Stock Price - Last {days} Days', fontsize=16, fontweight='bold')
-            plt.xlabel('Date', fontsize=12)
-            plt.ylabel('Price ($)', fontsize=12)
-            plt.grid(True, alpha=0.3)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            
-            # Save to buffer
-            buffer = io.BytesIO()
-            plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-            buffer.seek(0)
-            plt.close()
-            
-            # Calculate stats
-            first_price = closes[0]
-            last_price = closes[-1]
-            change = last_price - first_price
-            change_pct = (change / first_price) * 100
-            
-            embed = discord.Embed(
-                title=f"📊 {symbol} Chart ({days} days)",
-                color=discord.Color.green() if change >= 0 else discord.Color.red(),
-                timestamp=datetime.now()
-            )
-            
-            embed.add_field(name="Current Price", value=f"${last_price:.2f}", inline=True)
-            embed.add_field(name="Period Change", value=f"${change:+.2f} ({change_pct:+.2f}%)", inline=True)
-            embed.add_field(name="High", value=f"${max(closes):.2f}", inline=True)
-            embed.add_field(name="Low", value=f"${min(closes):.2f}", inline=True)
-            
-            file = discord.File(buffer, filename=f"{symbol}_chart.png")
-            embed.set_image(url=f"attachment://{symbol}_chart.png")
-            
-            await interaction.followup.send(embed=embed, file=file)
-        else:
-            await interaction.followup.send(f"❌ Could not find data for symbol: {symbol}")
-            
+            png = await render_chart(_render_price_chart, symbol, days, dates, closes)
+            cache_chart(key, png)
+        
+        first_price = closes[0]
+        last_price = closes[-1]
+        
+        # Calculate stats
+        change = last_price - first_price
+        change_pct = (change / first_price) * 100
+        
+        embed = discord.Embed(
+            title=f"📊 {symbol} Chart ({days} days)",
+            color=discord.Color.green() if change >= 0 else discord.Color.red(),
+            timestamp=datetime.now()
+        )
+        
+        embed.add_field(name="Current Price", value=f"${last_price:.2f}", inline=True)
+        embed.add_field(name="Period Change", value=f"${change:+.2f} ({change_pct:+.2f}%)", inline=True)
+        embed.add_field(name="High", value=f"${closes.max():.2f}", inline=True)
+        embed.add_field(name="Low", value=f"${closes.min():.2f}", inline=True)
+        
+        file = discord.File(io.BytesIO(png), filename=f"{symbol}_chart.png")
+        embed.set_image(url=f"attachment://{symbol}_chart.png")
+        
+        await interaction.followup.send(embed=embed, file=file)
+    
     except Exception as e:
         await interaction.followup.send(f"❌ Error generating chart: {str(e)}")
 
@@ -192,7 +644,7 @@ async def get_account(interaction: discord.Interaction):
     await interaction.response.defer()
     
     try:
-        account = alpaca_trading_client.get_account()
+        account = await asyncio.to_thread(alpaca_trading_client.get_account)
         
         embed = discord.Embed(
             title="💼 Account Information",
@@ -233,20 +685,15 @@ async def get_positions(interaction: discord.Interaction):
     await interaction.response.defer()
     
     try:
-        positions = alpaca_trading_client.get_all_positions()
+        positions = await asyncio.to_thread(alpaca_trading_client.get_all_positions)
         
         if not positions:
             await interaction.followup.send("📭 You don't have any open positions.")
             return
         
-        embed = discord.Embed(
-            title="📊 Current Positions",
-            color=discord.Color.gold(),
-            timestamp=datetime.now()
-        )
-        
         total_value = 0
         total_pl = 0
+        lines = []
         
         for position in positions[:10]:  # Limit to 10 positions
             qty = float(position.qty)
@@ -258,21 +705,21 @@ async def get_positions(interaction: discord.Interaction):
             total_value += market_value
             total_pl += unrealized_pl
             
-            field_value = (
-                f"**Quantity:** {qty}\n"
-                f"**Current Price:** ${current_price:.2f}\n"
-                f"**Market Value:** ${market_value:,.2f}\n"
-                f"**P&L:** {'📈' if unrealized_pl >= 0 else '📉'} ${unrealized_pl:+,.2f} ({unrealized_plpc:+.2f}%)"
+            lines.append(
+                f"**{position.symbol}** — {qty} @ ${current_price:.2f} = ${market_value:,.2f} | "
+                f"P&L {'📈' if unrealized_pl >= 0 else '📉'} ${unrealized_pl:+,.2f} ({unrealized_plpc:+.2f}%)"
             )
-            
-            embed.add_field(name=position.symbol, value=field_value, inline=True)
         
         if len(positions) > 10:
-            embed.add_field(
-                name="...",
-                value=f"*And {len(positions) - 10} more positions*",
-                inline=False
-            )
+            lines.append(f"*And {len(positions) - 10} more positions*")
+        
+        # One joined description instead of an add_field call per position
+        embed = discord.Embed(
+            title="📊 Current Positions",
+            description="\n".join(lines),
+            color=discord.Color.gold(),
+            timestamp=datetime.now()
+        )
         
         total_pl_pct = (total_pl / (total_value - total_pl)) * 100 if (total_value - total_pl) != 0 else 0
         embed.add_field(
@@ -293,7 +740,7 @@ async def market_status(interaction: discord.Interaction):
     await interaction.response.defer()
     
     try:
-        clock = alpaca_trading_client.get_clock()
+        clock = await asyncio.to_thread(alpaca_trading_client.get_clock)
         
         embed = discord.Embed(
             title="🏦 Market Status",
@@ -331,42 +778,25 @@ async def compare_stocks(interaction: discord.Interaction, symbols: str, days: i
         elif days < 1:
             days = 1
         
-        plt.figure(figsize=(12, 6))
-        
-        colors = ['#00A3E0', '#FF6B6B', '#4ECDC4', '#FFD93D', '#A8E6CF']
+        # Fetch every symbol in one batched request instead of one per symbol
+        bars = await get_bars(DAILY_BARS_PARAMS, symbol_list, datetime.now(timezone.utc) - timedelta(days=days))
         
-        for idx, symbol in enumerate(symbol_list):
-            request_params = StockBarsRequest(
-                symbol_or_symbols=symbol,
-                timeframe=TimeFrame.Day,
-                start=datetime.now() - timedelta(days=days)
-            )
-            
-            bars = alpaca_data_client.get_stock_bars(request_params)
+        # Same rule as /chart: key on each series' first and last bars
+        key = ("compare", days) + tuple(
+            (symbol, bars[symbol][0].timestamp, bars[symbol][-1].timestamp) if bars.get(symbol) else (symbol,)
+            for symbol in symbol_list
+        )
+        png = get_cached_chart(key)
+        
+        if png is None:
+            series = []
+            for idx, symbol in enumerate(symbol_list):
+                if bars.get(symbol):
+                    dates, closes = _bars_to_arrays(bars[symbol])
+                    series.append((symbol, dates, closes, CHART_COLORS[idx % len(CHART_COLORS)]))
             
-            if symbol in bars.data and len(bars.data[symbol]) > 0:
-                data = bars.data[symbol]
-                dates = [bar.timestamp for bar in data]
-                closes = [bar.close for bar in data]
-                
-                # Normalize to percentage change
-                normalized = [(price / closes[0] - 1) * 100 for price in closes]
-                
-                plt.plot(dates, normalized, linewidth=2, label=symbol, color=colors[idx % len(colors)])
-        
-        plt.title(f'Stock Comparison - Last {days} Days (% Change)', fontsize=16, fontweight='bold')
-        plt.xlabel('Date', fontsize=12)
-        plt.ylabel('% Change', fontsize=12)
-        plt.legend(loc='best')
-        plt.grid(True, alpha=0.3)
-        plt.axhline(y=0, color='black', linestyle='--', alpha=0.5)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        
-        buffer = io.BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        plt.close()
+            png = await render_chart(_render_comparison_chart, days, series)
+            cache_chart(key, png)
         
         embed = discord.Embed(
             title=f"📊 Stock Comparison",
@@ -375,7 +805,7 @@ async def compare_stocks(interaction: discord.Interaction, symbols: str, days: i
             timestamp=datetime.now()
         )
         
-        file = discord.File(buffer, filename="comparison_chart.png")
+        file = discord.File(io.BytesIO(png), filename="comparison_chart.png")
         embed.set_image(url="attachment://comparison_chart.png")
         
         await interaction.followup.send(embed=embed, file=file)
@@ -393,26 +823,15 @@ async def search_stocks(interaction: discord.Interaction, query: str):
         query = query.upper().strip()
         
         # Get all active US equity assets
-        search_params = GetAssetsRequest(
-            asset_class=AssetClass.US_EQUITY,
-            status=AssetStatus.ACTIVE
-        )
-        
-        assets = alpaca_trading_client.get_all_assets(search_params)
+        cache = await get_assets_cached()
         
-        # Filter assets by query (symbol or name)
-        matches = [
-            asset for asset in assets 
-            if query in asset.symbol.upper() or query in asset.name.upper()
-        ]
+        # Filter assets by query (symbol or name), limited to 15 results
+        matches = find_assets(cache, query, 15)
         
         if not matches:
             await interaction.followup.send(f"❌ No stocks found matching: `{query}`")
             return
         
-        # Limit to 15 results
-        matches = matches[:15]
-        
         embed = discord.Embed(
             title=f"🔍 Search Results for '{query}'",
             description=f"Top {len(matches)} stock{'s' if len(matches) != 1 else ''}",
@@ -448,46 +867,10 @@ async def popular_stocks(interaction: discord.Interaction, category: str = "tech
     """Show popular stocks by category"""
     await interaction.response.defer()
     
-    # Popular stock lists by category
-    stock_categories = {
-        "tech": {
-            "name": "Technology Giants",
-            "stocks": ["AAPL", "MSFT", "GOOGL", "META", "NVDA", "TSLA", "AMD", "INTC", "CRM", "ORCL"]
-        },
-        "finance": {
-            "name": "Financial Services",
-            "stocks": ["JPM", "BAC", "WFC", "GS", "MS", "C", "BLK", "AXP", "SCHW", "USB"]
-        },
-        "healthcare": {
-            "name": "Healthcare & Pharma",
-            "stocks": ["JNJ", "UNH", "PFE", "ABBV", "TMO", "MRK", "ABT", "LLY", "DHR", "CVS"]
-        },
-        "consumer": {
-            "name": "Consumer Goods",
-            "stocks": ["AMZN", "WMT", "HD", "NKE", "MCD", "SBUX", "TGT", "LOW", "COST", "PG"]
-        },
-        "energy": {
-            "name": "Energy & Oil",
-            "stocks": ["XOM", "CVX", "COP", "SLB", "EOG", "PXD", "MPC", "PSX", "VLO", "OXY"]
-        },
-        "entertainment": {
-            "name": "Media & Entertainment",
-            "stocks": ["DIS", "NFLX", "CMCSA", "WBD", "PARA", "EA", "TTWO", "LYV", "SPOT", "RBLX"]
-        },
-        "automotive": {
-            "name": "Automotive",
-            "stocks": ["TSLA", "F", "GM", "RIVN", "LCID", "NIO", "XPEV", "LI", "TM", "HMC"]
-        },
-        "airlines": {
-            "name": "Airlines & Travel",
-            "stocks": ["DAL", "AAL", "UAL", "LUV", "ALK", "JBLU", "SAVE", "HA", "SKYW", "ALGT"]
-        }
-    }
-    
     category = category.lower()
     
-    if category not in stock_categories:
-        available = ", ".join([f"`{cat}`" for cat in stock_categories.keys()])
+    if category not in STOCK_CATEGORIES:
+        available = ", ".join([f"`{cat}`" for cat in STOCK_CATEGORIES.keys()])
         await interaction.followup.send(
             f"❌ Invalid category. Available categories:\n{available}\n\n"
             f"Example: `/popular tech`"
@@ -495,7 +878,7 @@ async def popular_stocks(interaction: discord.Interaction, category: str = "tech
         return
     
     try:
-        cat_info = stock_categories[category]
+        cat_info = STOCK_CATEGORIES[category]
         symbols = cat_info["stocks"]
         
         embed = discord.Embed(
@@ -505,18 +888,15 @@ async def popular_stocks(interaction: discord.Interaction, category: str = "tech
             timestamp=datetime.now()
         )
         
-        # Get current prices for these stocks
-        request_params = StockBarsRequest(
-            symbol_or_symbols=symbols,
-            timeframe=TimeFrame.Minute,
-            start=datetime.now() - timedelta(days=1)
-        )
-        
-        bars = alpaca_data_client.get_stock_bars(request_params)
+        # Get current prices for these stocks, fetching directly if the poller's snapshot is stale
+        if time.time() - _popular_snapshot["ts"] <= POPULAR_MAX_AGE:
+            latest = _popular_snapshot["quotes"]
+        else:
+            latest = await get_latest_bars(symbols)
         
         for symbol in symbols:
-            if symbol in bars.data and len(bars.data[symbol]) > 0:
-                latest_bar = bars.data[symbol][-1]
+            latest_bar = latest.get(symbol)
+            if latest_bar is not None:
                 change = latest_bar.close - latest_bar.open
                 change_pct = (change / latest_bar.open) * 100
                 
@@ -541,29 +921,8 @@ async def popular_stocks(interaction: discord.Interaction, category: str = "tech
 @bot.tree.command(name="browse", description="Browse all available stock categories")
 async def browse_categories(interaction: discord.Interaction):
     """Show all available stock categories"""
-    
-    embed = discord.Embed(
-        title="📂 Browse Stock Categories",
-        description="Choose a category to explore popular stocks",
-        color=discord.Color.purple(),
-        timestamp=datetime.now()
-    )
-    
-    categories = [
-        ("💻 Tech", "`/popular tech`\nApple, Microsoft, Google, Meta, Nvidia, Tesla, AMD, Intel"),
-        ("💰 Finance", "`/popular finance`\nJPMorgan, Bank of America, Wells Fargo, Goldman Sachs"),
-        ("🏥 Healthcare", "`/popular healthcare`\nJohnson & Johnson, UnitedHealth, Pfizer, AbbVie"),
-        ("🛒 Consumer", "`/popular consumer`\nAmazon, Walmart, Home Depot, Nike, McDonald's"),
-        ("⚡ Energy", "`/popular energy`\nExxon, Chevron, ConocoPhillips, Schlumberger"),
-        ("🎬 Entertainment", "`/popular entertainment`\nDisney, Netflix, Comcast, EA, Spotify"),
-        ("🚗 Automotive", "`/popular automotive`\nTesla, Ford, GM, Rivian, Lucid, NIO"),
-        ("✈️ Airlines", "`/popular airlines`\nDelta, American, United, Southwest"),
-    ]
-    
-    for name, value in categories:
-        embed.add_field(name=name, value=value, inline=False)
-    
-    embed.set_footer(text="Or use /search <query> to find specific stocks")
+    embed = _BROWSE_EMBED.copy()
+    embed.timestamp = datetime.now()
     
     await interaction.response.send_message(embed=embed)
 
@@ -571,30 +930,8 @@ async def browse_categories(interaction: discord.Interaction):
 @bot.tree.command(name="help", description="Show all available commands")
 async def help_command(interaction: discord.Interaction):
     """Display help information"""
-    embed = discord.Embed(
-        title="📚 Stock Market Bot Commands",
-        description="Track stocks and manage your portfolio with Alpaca API",
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
-    )
-    
-    commands_info = [
-        ("🔍 /search <query>", "Search for stocks by symbol or name\nExample: `/search Apple` or `/search TSLA`"),
-        ("📂 /browse", "Browse all available stock categories"),
-        ("⭐ /popular [category]", "View popular stocks by category\nExample: `/popular tech` or `/popular finance`"),
-        ("📈 /price <symbol>", "Get the latest price of a stock\nExample: `/price AAPL`"),
-        ("📊 /chart <symbol> [days]", "Display a stock price chart\nExample: `/chart TSLA 60`"),
-        ("📊 /compare <symbols> [days]", "Compare multiple stocks\nExample: `/compare AAPL,TSLA,MSFT 30`"),
-        ("💼 /account", "View your Alpaca account information"),
-        ("📊 /positions", "View your current stock positions"),
-        ("🏦 /market", "Check if the stock market is open"),
-        ("📚 /help", "Show this help message"),
-    ]
-    
-    for name, value in commands_info:
-        embed.add_field(name=name, value=value, inline=False)
-    
-    embed.set_footer(text="Powered by Alpaca API")
+    embed = _HELP_EMBED.copy()
+    embed.timestamp = datetime.now()
     
     await interaction.response.send_message(embed=embed)
 
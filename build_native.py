@@ -0,0 +1,31 @@
+"""Ahead-of-time compile the chart kernels into the bot_native extension module.
+
+Run once after installing the requirements (needs a C compiler):
+
+    python3 build_native.py
+
+bot.py imports bot_native when it's present, so restarts skip numba's JIT
+compile; without it the bot falls back to JIT-compiling chart_kernels.
+
+Any bot_native build that exists always wins over chart_kernels.py, so
+rerun this script after changing the kernels (or delete bot_native*.so),
+otherwise the bot keeps running the old compiled code.
+
+numba.pycc is pending deprecation (NumbaPendingDeprecationWarning since
+numba 0.57) and may be removed in a future numba release; the JIT
+fallback keeps working if this build ever stops being possible.
+"""
+import os
+
+from numba.pycc import CC
+
+import chart_kernels
+
+cc = CC("bot_native")
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+cc.export("lttb_core", "i8[:](f8[:], f8[:], i8)")(chart_kernels.lttb_core)
+cc.export("normalize_pct", "f8[:](f8[:])")(chart_kernels.normalize_pct)
+
+if __name__ == "__main__":
+    cc.compile()
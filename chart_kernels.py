@@ -0,0 +1,53 @@
+"""Numeric chart kernels shared by bot.py and build_native.py.
+
+These are plain functions over float64 NumPy arrays so they can be compiled
+either ahead of time (build_native.py) or with numba's JIT at startup.
+"""
+import numpy as np
+
+
+def lttb_core(x, y, n_out):
+    """LTTB inner loop over float64 arrays; returns the indices of the points to keep"""
+    n = len(x)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    indices[n_out - 1] = n - 1
+    
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    every = (n - 2) / (n_out - 2)
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        
+        # Average of the next bucket (or the last point for the final bucket)
+        if i < n_out - 3:
+            next_end = int((i + 2) * every) + 1
+            avg_x = 0.0
+            avg_y = 0.0
+            for j in range(end, next_end):
+                avg_x += x[j]
+                avg_y += y[j]
+            avg_x /= next_end - end
+            avg_y /= next_end - end
+        else:
+            avg_x = x[n - 1]
+            avg_y = y[n - 1]
+        
+        # Keep the point forming the largest triangle with the previous pick and the next average
+        max_area = -1.0
+        picked = start
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area = area
+                picked = j
+        a = picked
+        indices[i + 1] = a
+    
+    return indices
+
+
+def normalize_pct(values):
+    """Percentage change of each value relative to the first one"""
+    return (values / values[0] - 1.0) * 100.0